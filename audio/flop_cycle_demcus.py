@@ -1,57 +1,101 @@
-import time
 import os
 import sys
 import psutil
 import numpy as np
 import torch
+import torchaudio
+import torch.utils.benchmark as benchmark
 from demucs.pretrained import get_model
 from demucs.apply import apply_model
-from demucs.audio import AudioFile
+from demucs.audio import convert_audio_channels
+
+# Allow TF32 tensor-core matmuls on Ampere+ GPUs
+torch.set_float32_matmul_precision("high")
+
+def get_device():
+    """Pick the fastest available torch device (CUDA, then Apple MPS, then CPU)."""
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+def load_audio(audio_path, model, device):
+    """Decode with torchaudio, then resample and match channels on the target device."""
+    wav, samplerate = torchaudio.load(audio_path)
+    if device == "cuda":
+        # Page-locked host memory lets the copy run as an async DMA transfer
+        wav = wav.pin_memory().to(device, non_blocking=True)
+    else:
+        wav = wav.to(device)
+    if samplerate != model.samplerate:
+        wav = torchaudio.functional.resample(wav, samplerate, model.samplerate)
+    return convert_audio_channels(wav, model.audio_channels)
+
+def count_flops(model, segment, device):
+    """Count the FLOPs of one forward pass over ``segment`` with torch.profiler.
+
+    Only ops the profiler has FLOP formulas for (matmuls, 2D convs,
+    elementwise) are counted, so this is a lower bound that scales with the
+    segment length.
+    """
+    with torch.profiler.profile(with_flops=True) as prof:
+        apply_model(model, segment, device=device)
+    return sum(event.flops for event in prof.key_averages())
 
 def estimate_flops_per_cycle(audio_path):
     # Load model
+    device = get_device()
+    print(f"Using device: {device}")
     model = get_model("htdemucs")
     model.eval()
+    model.to(device)
     
     # Load audio
-    audio = AudioFile(audio_path).read(streams=0, samplerate=model.samplerate, channels=model.audio_channels)
+    audio = load_audio(audio_path, model, device)
     audio = audio.unsqueeze(0)
     segment = audio[:, :, :model.samplerate*10]  # 10 second segment
     
-    # Warm up
-    print("Warming up...")
-    with torch.no_grad():
-        _ = apply_model(model, segment)
-    
-    # Measure performance
+    # Measure performance; Timer handles warmup, picks the iteration count
+    # and synchronizes CUDA around each timed block
     print("Measuring performance...")
+    num_calls = 0
+    
+    def run_model():
+        nonlocal num_calls
+        num_calls += 1
+        apply_model(model, segment, device=device)
+    
+    # Timer defaults to one thread; keep torch's pool as a real run would use it
+    timer = benchmark.Timer(stmt="run_model()", globals={"run_model": run_model},
+                            num_threads=torch.get_num_threads())
     process = psutil.Process(os.getpid())
     start_cpu = process.cpu_times()
-    start_time = time.time()
     
-    with torch.no_grad():
-        _ = apply_model(model, segment)
+    with torch.inference_mode(), torch.autocast(device_type="cuda", dtype=torch.float16, enabled=(device == "cuda")):
+        measurement = timer.blocked_autorange(min_run_time=1.0)
     
-    end_time = time.time()
     end_cpu = process.cpu_times()
     
-    # Calculate metrics
-    wall_time = end_time - start_time
-    cpu_time = (end_cpu.user - start_cpu.user) + (end_cpu.system - start_cpu.system)
+    # Calculate metrics (per forward pass, CPU time averaged over every call
+    # including the Timer's own warmup)
+    num_runs = len(measurement.times) * measurement.number_per_run
+    wall_time = measurement.median
+    cpu_time = ((end_cpu.user - start_cpu.user) + (end_cpu.system - start_cpu.system)) / num_calls
     
-    # Estimate FLOPS (Demucs has ~400M parameters)
-    params = 400000000
-    estimated_flops = params * 2
+    # Measure FLOPs for one forward pass over the segment
+    with torch.inference_mode(), torch.autocast(device_type="cuda", dtype=torch.float16, enabled=(device == "cuda")):
+        flops = count_flops(model, segment, device)
     
     # Estimate cycles (Apple Silicon ~3.2GHz)
     cpu_freq = 3200000000
     estimated_cycles = cpu_time * cpu_freq
-    flops_per_cycle = estimated_flops / estimated_cycles if estimated_cycles > 0 else 0
+    flops_per_cycle = flops / estimated_cycles if estimated_cycles > 0 else 0
     
     print(f"\nPerformance Metrics:")
-    print(f"Wall Time: {wall_time:.2f}s")
+    print(f"Wall Time: {wall_time:.2f}s (median of {num_runs} runs, IQR {measurement.iqr:.3f}s)")
     print(f"CPU Time: {cpu_time:.2f}s")
-    print(f"Estimated FLOPS: {estimated_flops:,}")
+    print(f"Measured FLOPs: {flops:,}")
     print(f"Estimated Cycles: {estimated_cycles:,.0f}")
     print(f"FLOPS/Cycle: {flops_per_cycle:.4f}")
     
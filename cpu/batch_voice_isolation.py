@@ -1,13 +1,23 @@
 import os
+
+# Silence TensorFlow's C++ info/warning logs; must be set before TF is imported
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
 import sys
+import stat
 import time
+import fcntl
+import shutil
+import queue
 import logging
+import threading
 import traceback
+import tempfile
 import subprocess
 from pathlib import Path
 from spleeter.separator import Separator
+import tensorflow as tf
 import numpy as np
-import librosa
 import soundfile as sf
 
 # Set up logging
@@ -25,15 +35,28 @@ logger = logging.getLogger(__name__)
 BATCH_SIZE_SECONDS = 600  # 10 minutes per batch
 OVERLAP_SECONDS = 5  # 5 second overlap between batches to avoid artifacts at boundaries
 SAMPLE_RATE = 44100  # Standard sample rate
+PIPE_SIZE = 1 << 20  # 1 MiB kernel pipe for ffmpeg's PCM output (the unprivileged maximum)
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)  # only exposed by fcntl from Python 3.10
+CHANNELS = 2  # Spleeter expects stereo input
+FRAME_BYTES = np.dtype(np.float32).itemsize * CHANNELS
+# ffmpeg output arguments for raw float32 PCM on stdout, built once
+FFMPEG_PCM_OUTPUT_ARGS = ['-f', 'f32le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE), 'pipe:1']
 
 def validate_file(file_path):
-    """Check if the input file exists and is a supported audio format."""
+    """Check if the input file exists and is a supported audio format.
+
+    Returns (is_valid, error_msg, size_bytes) from a single stat call.
+    """
     supported_formats = {'.mp3', '.wav', '.flac', '.ogg'}
-    if not os.path.isfile(file_path):
-        return False, "Error: File does not exist."
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return False, "Error: File does not exist.", 0
+    if not stat.S_ISREG(st.st_mode):
+        return False, "Error: File does not exist.", 0
     if not any(file_path.lower().endswith(fmt) for fmt in supported_formats):
-        return False, "Error: Unsupported file format. Use MP3, WAV, FLAC, or OGG."
-    return True, ""
+        return False, "Error: Unsupported file format. Use MP3, WAV, FLAC, or OGG.", 0
+    return True, "", st.st_size
 
 def format_time(seconds):
     """Format seconds into hours, minutes, and seconds."""
@@ -47,119 +70,162 @@ def format_time(seconds):
     else:
         return f"{secs}s"
 
+def bytes_to_mb(size_bytes):
+    """Convert a size in bytes to MB."""
+    return size_bytes / (1024 * 1024)
+
 def get_file_size_mb(file_path):
     """Get file size in MB."""
-    return os.path.getsize(file_path) / (1024 * 1024)
+    return bytes_to_mb(os.stat(file_path).st_size)
 
 def get_audio_duration(file_path):
-    """Get the duration of an audio file in seconds."""
-    try:
-        duration = librosa.get_duration(path=file_path)
-        return duration
-    except Exception as e:
-        logger.error(f"Error getting audio duration: {str(e)}")
-        # Fallback using ffprobe
+    """Get the duration of an audio file in seconds from its header."""
+    if not file_path.lower().endswith('.mp3'):
         try:
-            result = subprocess.run(
-                ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 
-                 'default=noprint_wrappers=1:nokey=1', file_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            return float(result.stdout.strip())
-        except Exception as ffprobe_error:
-            logger.error(f"Error using ffprobe fallback: {str(ffprobe_error)}")
-            return -1
-
-def split_audio(file_path, output_dir, batch_size=BATCH_SIZE_SECONDS, overlap=OVERLAP_SECONDS):
-    """Split audio file into batches with overlap."""
+            # WAV/FLAC/OGG headers store frame count and sample rate
+            return sf.info(file_path).duration
+        except Exception as e:
+            logger.error(f"Error reading audio header: {str(e)}")
+    # MP3 (or unreadable header): ask ffprobe, which only parses the container
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 
+             'default=noprint_wrappers=1:nokey=1', file_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        return float(result.stdout.strip())
+    except Exception as ffprobe_error:
+        logger.error(f"Error getting audio duration with ffprobe: {str(ffprobe_error)}")
+        return -1
+
+def count_batches(duration, batch_size=BATCH_SIZE_SECONDS, overlap=OVERLAP_SECONDS):
+    """Number of overlapping batches needed to cover the given duration."""
+    if duration <= batch_size:
+        return 1
+    return int(np.ceil((duration - overlap) / (batch_size - overlap)))
+
+def split_audio(file_path, batch_size=BATCH_SIZE_SECONDS, overlap=OVERLAP_SECONDS):
+    """Decode the input with ffmpeg and yield overlapping batches as they arrive.
+
+    ffmpeg streams raw float32 PCM over a pipe, so only about one batch of
+    audio is held in memory at a time and the file is decoded exactly once.
+    """
     logger.info(f"Loading audio file: {file_path}")
     print("Loading audio file...")
     
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Get audio duration to calculate number of batches
-    duration = get_audio_duration(file_path)
-    if duration <= 0:
-        logger.error("Failed to determine audio duration")
-        return []
-    
-    # Calculate number of batches
-    if duration <= batch_size:
-        # File is small enough, no need to split
-        logger.info(f"Audio duration ({duration:.2f}s) is less than batch size, no splitting needed")
-        # Create a symbolic link or copy to avoid loading the file twice
-        batch_path = os.path.join(output_dir, "batch_full.wav")
-        if file_path.lower().endswith('.wav'):
-            # Create symlink for WAV files
-            if os.path.exists(batch_path):
-                os.remove(batch_path)
-            os.symlink(os.path.abspath(file_path), batch_path)
-        else:
-            # Convert to WAV for non-WAV files
-            logger.info(f"Converting {file_path} to WAV format")
-            subprocess.run([
-                'ffmpeg', '-i', file_path, '-ar', str(SAMPLE_RATE), batch_path
-            ], check=True)
-        return [batch_path]
-    
-    # Longer file, need to split into batches
-    num_batches = int(np.ceil((duration - overlap) / (batch_size - overlap)))
-    logger.info(f"Audio duration: {duration:.2f}s, splitting into {num_batches} batches")
-    print(f"Audio duration: {format_time(duration)}, splitting into {num_batches} batches...")
-    
-    batch_files = []
-    for i in range(num_batches):
-        # Calculate start and end times for this batch
-        start_time = max(0, i * (batch_size - overlap))
-        end_time = min(duration, start_time + batch_size)
-        
-        batch_path = os.path.join(output_dir, f"batch_{i:03d}.wav")
-        logger.info(f"Creating batch {i+1}/{num_batches}: {start_time:.2f}s to {end_time:.2f}s")
-        
-        # Use ffmpeg to extract the segment
-        subprocess.run([
-            'ffmpeg', '-y', '-i', file_path, 
-            '-ss', str(start_time), '-to', str(end_time),
-            '-ar', str(SAMPLE_RATE), batch_path
-        ], check=True)
-        
-        batch_files.append(batch_path)
-        print(f"Prepared batch {i+1}/{num_batches} ({start_time:.1f}s to {end_time:.1f}s)")
+    batch_samples = batch_size * SAMPLE_RATE
+    overlap_samples = overlap * SAMPLE_RATE
     
-    return batch_files
+    # stderr goes to a temp file rather than a pipe: a damaged file can log
+    # an error per frame, and a full stderr pipe would stall the stdout read
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        ['ffmpeg', '-loglevel', 'error', '-i', file_path] + FFMPEG_PCM_OUTPUT_ARGS,
+        stdout=subprocess.PIPE, stderr=stderr_file)
+    try:
+        # Grow the pipe from the kernel's 64 KiB default so each read() moves
+        # up to PIPE_SIZE of audio; the default still works if this is refused
+        fcntl.fcntl(process.stdout.fileno(), F_SETPIPE_SZ, PIPE_SIZE)
+    except OSError:
+        pass
+    try:
+        prev_batch = None
+        while True:
+            # Read straight into a fresh batch buffer; only the overlap is copied
+            batch = np.empty((batch_samples, CHANNELS), dtype=np.float32)
+            filled = 0
+            if prev_batch is not None:
+                batch[:overlap_samples] = prev_batch[-overlap_samples:]
+                filled = overlap_samples
+            read_bytes = process.stdout.readinto(memoryview(batch[filled:]).cast('B'))
+            if not read_bytes:
+                break
+            filled += read_bytes // FRAME_BYTES
+            batch = batch[:filled]
+            yield batch
+            if filled < batch_samples:
+                break
+            prev_batch = batch
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+        with stderr_file:
+            stderr_file.seek(0)
+            stderr = stderr_file.read()
+        if process.returncode not in (0, -9) and stderr:
+            logger.error(f"ffmpeg decode error: {stderr.decode(errors='replace').strip()}")
 
-def process_batch(batch_file, output_dir, separator):
-    """Process a single batch using Spleeter."""
-    logger.info(f"Processing batch: {batch_file}")
-    
-    # Get the base filename without extension
-    batch_name = os.path.basename(batch_file)
-    batch_stem = os.path.splitext(batch_name)[0]
-    
-    # Create temporary output directory for this batch
-    batch_output_dir = os.path.join(output_dir, f"{batch_stem}_temp")
-    os.makedirs(batch_output_dir, exist_ok=True)
-    
-    # Process batch with spleeter
-    logger.info(f"Running spleeter on {batch_file}")
+def put_until_stopped(target_queue, item, stop_event):
+    """Put an item on a bounded queue, giving up once the pipeline is stopped."""
+    while not stop_event.is_set():
+        try:
+            target_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def decode_worker(file_path, decode_queue, stop_event):
+    """Pipeline stage 1: decode batches and hand them to the separation stage."""
+    batches = split_audio(file_path)
     try:
-        separator.separate_to_file(batch_file, batch_output_dir)
-        
-        # Get path to the vocals output
-        vocals_path = os.path.join(batch_output_dir, batch_stem, "vocals.wav")
-        if not os.path.exists(vocals_path):
-            logger.error(f"Vocals file not found: {vocals_path}")
-            return None
-        
-        return vocals_path
+        for i, batch in enumerate(batches):
+            if not put_until_stopped(decode_queue, (i, batch), stop_event):
+                break
     except Exception as e:
-        logger.error(f"Error processing batch {batch_file}: {str(e)}")
+        logger.error(f"Error decoding audio: {str(e)}")
+        logger.error(traceback.format_exc())
+        put_until_stopped(decode_queue, e, stop_event)
+    finally:
+        batches.close()
+        put_until_stopped(decode_queue, None, stop_event)
+
+def write_worker(write_queue, output_dir, vocal_files):
+    """Pipeline stage 3: write separated vocals to disk in batch order."""
+    while True:
+        item = write_queue.get()
+        if item is None:
+            break
+        batch_index, vocals = item
+        vocals_path = os.path.join(output_dir, f"batch_{batch_index:03d}_vocals.wav")
+        try:
+            sf.write(vocals_path, vocals, SAMPLE_RATE)
+            vocal_files.append(vocals_path)
+        except Exception as e:
+            logger.error(f"Error writing batch {batch_index+1}: {str(e)}")
+            logger.error(traceback.format_exc())
+
+def process_batch(batch, batch_index, separator):
+    """Process a single in-memory batch using Spleeter and return its vocals."""
+    logger.info(f"Running spleeter on batch {batch_index+1}")
+    try:
+        return separator.separate(batch)['vocals']
+    except Exception as e:
+        logger.error(f"Error processing batch {batch_index+1}: {str(e)}")
         logger.error(traceback.format_exc())
         return None
 
+def concat_audio_files(vocal_files, output_file):
+    """Concatenate vocal files with ffmpeg's concat demuxer, stream-copying packets."""
+    concat_file = os.path.splitext(output_file)[0] + "_concat_list.txt"
+    with open(concat_file, "w") as f:
+        for vfile in vocal_files:
+            f.write(f"file '{os.path.abspath(vfile)}'\n")
+    try:
+        subprocess.run([
+            'ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', 
+            '-i', concat_file, '-c', 'copy', str(output_file)
+        ], check=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error concatenating audio files: {str(e)}")
+        return False
+    finally:
+        os.remove(concat_file)
+
 def merge_audio_files(vocal_files, output_file, overlap=OVERLAP_SECONDS):
     """Merge multiple vocal files with crossfade between them."""
     logger.info(f"Merging {len(vocal_files)} vocal files with {overlap}s overlap")
@@ -168,66 +234,48 @@ def merge_audio_files(vocal_files, output_file, overlap=OVERLAP_SECONDS):
     if len(vocal_files) == 1:
         # Just copy the single file
         logger.info("Only one file to merge, copying directly")
-        subprocess.run(['cp', vocal_files[0], output_file], check=True)
+        try:
+            os.link(vocal_files[0], output_file)
+        except OSError:
+            shutil.copyfile(vocal_files[0], output_file)
         return True
     
-    # Use ffmpeg to concatenate with crossfade
-    concat_file = os.path.splitext(output_file)[0] + "_concat_list.txt"
-    with open(concat_file, "w") as f:
-        for vfile in vocal_files:
-            f.write(f"file '{os.path.abspath(vfile)}'\n")
-    
-    # Use ffmpeg filter complex to concatenate with crossfade
-    filter_complex = ""
-    for i in range(len(vocal_files) - 1):
-        if i == 0:
-            filter_complex += f"[0:0][1:0]acrossfade=d={overlap}:c1=tri:c2=tri[out1];"
-        else:
-            filter_complex += f"[out{i}][{i+1}:0]acrossfade=d={overlap}:c1=tri:c2=tri[out{i+1}];"
-    
-    # Construct the ffmpeg command
-    ffmpeg_cmd = [
-        'ffmpeg', '-y', '-f', 'concat', '-safe', '0', 
-        '-i', concat_file, '-filter_complex', filter_complex
-    ]
-    
-    # Add the output name correctly
-    last_output = f"[out{len(vocal_files)-1}]"
-    ffmpeg_cmd += ['-map', last_output, output_file]
-    
-    try:
-        # Run the command
-        subprocess.run(ffmpeg_cmd, check=True)
-        
-        # Clean up the concat file
-        os.remove(concat_file)
-        
-        logger.info(f"Successfully merged files to {output_file}")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error merging audio files: {str(e)}")
-        
-        # Fallback to simpler method if complex filter fails
-        logger.info("Trying simpler concatenation method...")
+    if overlap == 0:
+        # All segments are written by write_worker with identical WAV
+        # parameters, so they can be joined without decoding or re-encoding
+        if concat_audio_files(vocal_files, output_file):
+            logger.info(f"Successfully concatenated files to {output_file}")
+            return True
+    else:
         try:
-            # Simple concatenation without crossfade
-            subprocess.run([
-                'ffmpeg', '-y', '-f', 'concat', '-safe', '0', 
-                '-i', concat_file, '-c', 'copy', output_file
-            ], check=True)
+            # Crossfade adjacent segments in numpy and write the result once
+            fade_len = int(overlap * SAMPLE_RATE)
+            fade_in = np.linspace(0, 1, fade_len, dtype=np.float32)[:, np.newaxis]
+            fade_out = 1 - fade_in
+            segments = [sf.read(vfile, dtype='float32', always_2d=True)[0] for vfile in vocal_files]
+            for prev, seg in zip(segments, segments[1:]):
+                seg[:fade_len] = prev[-fade_len:] * fade_out + seg[:fade_len] * fade_in
+            merged = np.concatenate([seg[:-fade_len] for seg in segments[:-1]] + [segments[-1]])
+            sf.write(str(output_file), merged, SAMPLE_RATE, subtype='PCM_16')
             
-            os.remove(concat_file)
+            logger.info(f"Successfully merged files to {output_file}")
+            return True
+        except Exception as e:
+            logger.error(f"Error merging audio files: {str(e)}")
+        
+        # Fallback to simpler method if the crossfade merge fails
+        logger.info("Trying simpler concatenation method...")
+        if concat_audio_files(vocal_files, output_file):
             logger.info(f"Successfully merged files using simple method to {output_file}")
             return True
-        except subprocess.CalledProcessError as e2:
-            logger.error(f"Error in fallback merging: {str(e2)}")
-            return False
+    
+    logger.error("Failed to merge audio files")
+    return False
 
 def cleanup_temp_files(temp_dir):
     """Clean up temporary files and directories."""
     logger.info(f"Cleaning up temporary directory: {temp_dir}")
     try:
-        import shutil
         if os.path.exists(temp_dir):
             shutil.rmtree(temp_dir, ignore_errors=True)
         logger.info("Cleanup completed")
@@ -245,7 +293,6 @@ def main():
     
     # Check for GPU
     try:
-        import tensorflow as tf
         physical_devices = tf.config.list_physical_devices('GPU')
         if physical_devices:
             try:
@@ -263,6 +310,11 @@ def main():
         logger.error(f"Error checking for GPU: {str(tf_error)}")
         print("Unable to check for GPU. Continuing with CPU processing.")
     
+    # Initialize Spleeter once and reuse it for every file
+    print("Initializing Spleeter...")
+    logger.info("Initializing Spleeter")
+    separator = Separator('spleeter:2stems')
+    
     print("\nInstructions:")
     print("- Enter the full path to your audio file (e.g., /audio/interview.mp3).")
     print("- Make sure your audio files are in the 'audio' directory that's mounted to the container.")
@@ -283,7 +335,7 @@ def main():
         logger.info(f"User entered path: {input_path}")
 
         # Validate input file
-        is_valid, error_msg = validate_file(input_path)
+        is_valid, error_msg, file_size = validate_file(input_path)
         if not is_valid:
             logger.error(f"Invalid file: {error_msg}")
             print(error_msg)
@@ -291,13 +343,8 @@ def main():
 
         try:
             # Log file details
-            file_size_mb = get_file_size_mb(input_path)
+            file_size_mb = bytes_to_mb(file_size)
             logger.info(f"Processing file: {input_path} (Size: {file_size_mb:.2f} MB)")
-            
-            # Initialize Spleeter
-            print("Initializing Spleeter...")
-            logger.info("Initializing Spleeter")
-            separator = Separator('spleeter:2stems')
 
             # Get file details
             input_path_obj = Path(input_path)
@@ -328,30 +375,50 @@ def main():
                 print("Audio is short enough to process in one go.")
                 logger.info(f"Audio duration ({duration:.2f}s) is within batch size, processing as single batch")
             
-            # Split audio into batches
-            batch_dir = temp_output_dir / "batches"
-            batch_files = split_audio(input_path, batch_dir)
-            
-            if not batch_files:
-                raise Exception("Failed to split audio into batches")
+            if duration <= 0:
+                raise Exception("Failed to determine audio duration")
+            num_batches = count_batches(duration)
+            if num_batches > 1:
+                logger.info(f"Audio duration: {duration:.2f}s, splitting into {num_batches} batches")
+                print(f"Audio duration: {format_time(duration)}, splitting into {num_batches} batches...")
             
-            # Process each batch
+            # Run decode, separation and writing as a three-stage pipeline so
+            # ffmpeg and disk I/O overlap with Spleeter inference
+            decode_queue = queue.Queue(maxsize=2)
+            write_queue = queue.Queue(maxsize=2)
+            stop_event = threading.Event()
             vocal_files = []
-            for i, batch_file in enumerate(batch_files):
-                print(f"\nProcessing batch {i+1}/{len(batch_files)}...")
-                logger.info(f"Processing batch {i+1}/{len(batch_files)}: {batch_file}")
-                
-                start_time_batch = time.time()
-                vocal_file = process_batch(batch_file, temp_output_dir, separator)
-                
-                if vocal_file:
-                    vocal_files.append(vocal_file)
-                    end_time_batch = time.time()
-                    batch_time = end_time_batch - start_time_batch
-                    print(f"Batch {i+1} processed in {format_time(batch_time)}")
-                else:
-                    logger.error(f"Failed to process batch {i+1}")
-                    print(f"Failed to process batch {i+1}. See logs for details.")
+            decoder = threading.Thread(target=decode_worker, args=(input_path, decode_queue, stop_event), daemon=True)
+            writer = threading.Thread(target=write_worker, args=(write_queue, temp_output_dir, vocal_files), daemon=True)
+            decoder.start()
+            writer.start()
+            try:
+                while True:
+                    item = decode_queue.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    i, batch = item
+                    print(f"\nProcessing batch {i+1}/{num_batches}...")
+                    logger.info(f"Processing batch {i+1}/{num_batches}")
+                    
+                    start_time_batch = time.time()
+                    vocals = process_batch(batch, i, separator)
+                    
+                    if vocals is not None:
+                        write_queue.put((i, vocals))
+                        end_time_batch = time.time()
+                        batch_time = end_time_batch - start_time_batch
+                        print(f"Batch {i+1} processed in {format_time(batch_time)}")
+                    else:
+                        logger.error(f"Failed to process batch {i+1}")
+                        print(f"Failed to process batch {i+1}. See logs for details.")
+            finally:
+                stop_event.set()
+                write_queue.put(None)
+                writer.join()
+                decoder.join()
             
             # Check if at least one batch was processed successfully
             if not vocal_files:
@@ -411,26 +478,6 @@ def main():
 
 if __name__ == "__main__":
     try:
-        # Additional dependencies needed for batch processing
-        print("Checking for required dependencies...")
-        required_packages = [
-            ('librosa', 'librosa'),
-            ('soundfile', 'soundfile'),
-            ('numpy', 'numpy')
-        ]
-        
-        missing_packages = []
-        for package_name, import_name in required_packages:
-            try:
-                __import__(import_name)
-            except ImportError:
-                missing_packages.append(package_name)
-        
-        if missing_packages:
-            print(f"Installing missing dependencies: {', '.join(missing_packages)}")
-            subprocess.check_call([sys.executable, '-m', 'pip', 'install'] + missing_packages)
-            print("Dependencies installed successfully")
-        
         main()
     except Exception as e:
         logger.critical(f"Unhandled exception: {str(e)}")
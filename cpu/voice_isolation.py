@@ -1,37 +1,98 @@
 import os
+
+# CPU tuning for TensorFlow; these are read once when TF is imported, so
+# they must be set before spleeter/tensorflow are loaded
+_cpu_count = str(os.cpu_count() or 1)
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '1')
+os.environ.setdefault('TF_NUM_INTRAOP_THREADS', _cpu_count)
+os.environ.setdefault('TF_NUM_INTEROP_THREADS', '2')
+os.environ.setdefault('OMP_NUM_THREADS', _cpu_count)
+os.environ.setdefault('KMP_AFFINITY', 'granularity=fine,compact,1,0')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+
 import sys
+import glob
+import argparse
 import time
+import queue
+import tempfile
+import subprocess
+import atexit
 import logging
+import threading
 import traceback
+import warnings
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 import psutil
+
+# Spleeter drives TF 1.x-style graphs that emit deprecation warnings on import
+# and on every separation; they are noise for this tool
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+warnings.filterwarnings('ignore', category=FutureWarning)
+
+from spleeter.audio.adapter import AudioAdapter
 from spleeter.separator import Separator
+import numpy as np
+import soundfile as sf
+import tensorflow as tf
+
+try:
+    import av
+except ImportError:
+    av = None
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('/audio/voice_isolation_cpu.log')
-    ]
-)
+# Set up logging; records are handed to a background listener so console
+# and log-file writes stay off the processing thread
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_log_handlers = [logging.StreamHandler(), logging.FileHandler('/audio/voice_isolation_cpu.log')]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+# Added directly rather than via basicConfig, whose default formatter would
+# be baked into each record before the listener formats it again
+_root_logger = logging.getLogger()
+_root_logger.addHandler(QueueHandler(_log_queue))
+_root_logger.setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
+logging.getLogger('tensorflow').setLevel(logging.ERROR)
+
+# Use a GPU when the container has one; memory growth keeps TF from
+# reserving the whole card up front
+physical_devices = tf.config.list_physical_devices('GPU')
+for device in physical_devices:
+    try:
+        tf.config.experimental.set_memory_growth(device, True)
+    except Exception as e:
+        logger.warning(f"Error configuring GPU: {str(e)}")
+
+# Handle to this process for the per-file CPU/memory metrics
+_PROC = psutil.Process()
+
+SAMPLE_RATE = 44100  # Spleeter's pretrained models run at 44.1 kHz
+
+# Inputs larger than this are separated in overlapping chunks to bound peak memory
+SPLIT_THRESHOLD_MB = 50
+CHUNK_SECONDS = 60
+OVERLAP_SECONDS = 1
+
+SUPPORTED_FORMATS = ('.mp3', '.wav', '.flac', '.ogg')
 
 def validate_file(file_path):
     """Check if the input file exists and is a supported audio format."""
-    supported_formats = {'.mp3', '.wav', '.flac', '.ogg'}
     if not os.path.isfile(file_path):
         return False, "Error: File does not exist."
-    if not any(file_path.lower().endswith(fmt) for fmt in supported_formats):
+    if not file_path.lower().endswith(SUPPORTED_FORMATS):
         return False, "Error: Unsupported file format. Use MP3, WAV, FLAC, or OGG."
     return True, ""
 
 def format_time(seconds):
     """Format seconds into hours, minutes, and seconds."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
+    hours, rem = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rem, 60)
     if hours > 0:
         return f"{hours}h {minutes}m {secs}s"
     elif minutes > 0:
@@ -43,17 +104,396 @@ def get_file_size_mb(file_path):
     """Get file size in MB."""
     return os.path.getsize(file_path) / (1024 * 1024)
 
+def create_separator(stems=2):
+    """Build the ``stems``-stem separator used for every file in this process."""
+    return Separator(f'spleeter:{stems}stems', multiprocess=False)
+
+def load_audio_av(input_path, offset=None, duration=None):
+    """Decode (part of) a file with PyAV, resampling to SAMPLE_RATE stereo in-library."""
+    start = int(offset * SAMPLE_RATE) if offset else 0
+    wanted = int(duration * SAMPLE_RATE) if duration is not None else None
+    chunks = []
+    decoded = 0
+    with av.open(str(input_path)) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format='fltp', layout='stereo', rate=SAMPLE_RATE)
+        if start:
+            # Lands on or before the offset; the excess is trimmed below
+            container.seek(int(offset * av.time_base))
+        position = None
+
+        def collect(frames):
+            nonlocal position, decoded
+            for frame in frames:
+                data = frame.to_ndarray().T
+                skip = start - position
+                position += len(data)
+                if skip >= len(data):
+                    continue
+                if skip > 0:
+                    data = data[skip:]
+                chunks.append(data)
+                decoded += len(data)
+
+        for frame in container.decode(stream):
+            if position is None:
+                position = round((frame.time or 0) * SAMPLE_RATE)
+            collect(resampler.resample(frame))
+            if wanted is not None and decoded >= wanted:
+                break
+        else:
+            if position is not None:
+                collect(resampler.resample(None))
+
+    if not chunks:
+        return np.empty((0, 2), dtype=np.float32)
+    waveform = np.concatenate(chunks)
+    return waveform[:wanted] if wanted is not None else waveform
+
+def load_audio(input_path, offset=None, duration=None):
+    """Decode (part of) a file to float32 at SAMPLE_RATE via libsndfile, then PyAV, then Spleeter's adapter."""
+    try:
+        with sf.SoundFile(str(input_path)) as f:
+            samplerate = f.samplerate
+            if offset:
+                f.seek(int(offset * samplerate))
+            frames = int(duration * samplerate) if duration is not None else -1
+            waveform = f.read(frames, dtype='float32', always_2d=True)
+    except RuntimeError:
+        if av is not None:
+            try:
+                return load_audio_av(input_path, offset, duration)
+            except (av.error.FFmpegError, IndexError) as e:
+                logger.warning(f"PyAV could not decode {input_path}: {str(e)}")
+        waveform, _ = AudioAdapter.default().load(
+            str(input_path), offset=offset, duration=duration, sample_rate=SAMPLE_RATE)
+        return waveform
+
+    if samplerate != SAMPLE_RATE:
+        # Imported lazily; librosa is only needed for non-44.1 kHz input
+        import librosa
+        waveform = librosa.resample(waveform.T, orig_sr=samplerate, target_sr=SAMPLE_RATE).T
+    return waveform
+
+def stream_windows(input_path):
+    """Decode a file once through ffmpeg and yield CHUNK_SECONDS windows overlapping by OVERLAP_SECONDS."""
+    window = CHUNK_SECONDS * SAMPLE_RATE
+    overlap = OVERLAP_SECONDS * SAMPLE_RATE
+    frame_bytes = 2 * np.dtype(np.float32).itemsize
+    # stderr goes to a temp file rather than a pipe so a chatty decoder
+    # can't fill it and stall the stdout reads
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        ['ffmpeg', '-loglevel', 'error', '-i', str(input_path),
+         '-f', 'f32le', '-acodec', 'pcm_f32le', '-ac', '2', '-ar', str(SAMPLE_RATE), 'pipe:1'],
+        stdout=subprocess.PIPE, stderr=stderr_file)
+    try:
+        prev = None
+        while True:
+            buf = np.empty((window, 2), dtype=np.float32)
+            filled = 0
+            if prev is not None:
+                buf[:overlap] = prev[-overlap:]
+                filled = overlap
+            view = memoryview(buf).cast('B')
+            pos = filled * frame_bytes
+            while pos < len(view):
+                n = process.stdout.readinto(view[pos:])
+                if not n:
+                    break
+                pos += n
+            end = pos // frame_bytes
+            if end == filled:
+                break
+            yield buf[:end]
+            if end < window:
+                break
+            prev = buf
+        if process.wait() != 0:
+            stderr_file.seek(0)
+            error = stderr_file.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg could not decode {input_path}: {error}")
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_file.close()
+
+def separate_in_chunks(separator, input_path, output_file):
+    """Separate a large file window by window, crossfading the overlaps into ``output_file``."""
+    overlap = OVERLAP_SECONDS * SAMPLE_RATE
+    fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+    out = None
+    tail = None
+    chunk = 0
+    try:
+        for waveform in stream_windows(input_path):
+            chunk += 1
+            print(f"Separating chunk {chunk}...")
+            vocals = separator.separate(waveform)['vocals'][:len(waveform)]
+            if out is None:
+                out = sf.SoundFile(str(output_file), 'w', SAMPLE_RATE, vocals.shape[1], subtype='PCM_16')
+            if tail is not None:
+                n = min(len(tail), len(vocals))
+                vocals[:n] = tail[:n] * (1.0 - fade_in[:n]) + vocals[:n] * fade_in[:n]
+            # Hold back the overlap until the next window has been crossfaded in
+            out.write(vocals[:-overlap])
+            tail = vocals[-overlap:]
+        if tail is not None:
+            out.write(tail)
+    finally:
+        if out is not None:
+            out.close()
+
+def write_worker(jobs, failed):
+    """Write queued vocals to disk until a ``None`` job arrives, recording failures in ``failed``."""
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        vocals, temp_output_file, output_file = job
+        try:
+            sf.write(str(temp_output_file), vocals, SAMPLE_RATE, subtype='PCM_16')
+            os.replace(temp_output_file, output_file)
+            logger.info(f"Output file: {output_file} (Size: {get_file_size_mb(output_file):.2f} MB)")
+        except Exception as e:
+            logger.error(f"Failed to write {output_file}: {str(e)}")
+            logger.error(traceback.format_exc())
+            print(f"Error writing '{output_file}': {str(e)}")
+            failed.append(output_file)
+
+def process_file(input_path, separator, writer=None, output_dir=None, output_format='wav'):
+    """Isolate vocals from a single file using the shared separator.
+
+    Results are handed to ``writer`` when given; returns True on success.
+    """
+    # Validate input file
+    is_valid, error_msg = validate_file(input_path)
+    if not is_valid:
+        logger.error(f"Invalid file: {error_msg}")
+        print(error_msg)
+        return False
+
+    try:
+        # Log file details
+        file_size_mb = get_file_size_mb(input_path)
+        logger.info(f"Processing file: {input_path} (Size: {file_size_mb:.2f} MB)")
+
+        # Get file details
+        input_path = Path(input_path)
+        output_dir = Path(output_dir) if output_dir else input_path.parent
+        input_name = input_path.stem
+        output_file = output_dir / f"{input_name}_isolated.{output_format}"
+        # Only renamed to output_file once fully written
+        temp_output_file = output_dir / f"{input_name}_isolated.part.{output_format}"
+
+        # Process audio with timing and performance metrics
+        print(f"Processing '{input_path.name}' to isolate vocals...")
+        print(f"File size: {file_size_mb:.2f} MB - This may take a while for larger files.")
+        print("Processing... (Check logs for details)")
+
+        if file_size_mb > SPLIT_THRESHOLD_MB:
+            if not physical_devices:
+                print(f"\n⚠️ NOTICE: This is a large file. For files over {SPLIT_THRESHOLD_MB}MB, consider using the GPU version for faster processing.")
+            print(f"It will be processed in {CHUNK_SECONDS}s chunks to limit memory usage.")
+            logger.warning(f"Large file detected: {file_size_mb:.2f} MB. CPU processing may be slow.")
+
+        start_time = time.time()
+        logger.info(f"Starting separation process for {input_path.name}")
+
+        # Performance metrics
+        start_cpu = _PROC.cpu_times()
+        mem_before = _PROC.memory_info().rss / (1024 * 1024)
+        logger.info(f"Memory usage before processing: {mem_before:.2f} MB")
+
+        try:
+            # Separate in memory and write only the vocals stem
+            if file_size_mb > SPLIT_THRESHOLD_MB:
+                separate_in_chunks(separator, input_path, temp_output_file)
+            else:
+                waveform = load_audio(input_path)
+                vocals = separator.separate(waveform)['vocals']
+                if writer is not None:
+                    writer.put((vocals, temp_output_file, output_file))
+                else:
+                    sf.write(str(temp_output_file), vocals, SAMPLE_RATE, subtype='PCM_16')
+            logger.info("Separation completed successfully")
+        except Exception as sep_error:
+            logger.error(f"Separation failed: {str(sep_error)}")
+            logger.error(traceback.format_exc())
+            raise
+
+        queued = writer is not None and file_size_mb <= SPLIT_THRESHOLD_MB
+        if not queued:
+            try:
+                os.replace(temp_output_file, output_file)
+            except FileNotFoundError:
+                logger.error(f"Separation produced no output for {input_path.name}")
+                print("Error: Vocal separation failed to produce output.")
+                return False
+
+        # End performance metrics
+        end_time = time.time()
+        end_cpu = _PROC.cpu_times()
+        mem_after = _PROC.memory_info().rss / (1024 * 1024)
+        processing_time = end_time - start_time
+        cpu_time = (end_cpu.user - start_cpu.user) + (end_cpu.system - start_cpu.system)
+        mem_increase = mem_after - mem_before
+        formatted_time = format_time(processing_time)
+
+        # FLOPS/cycle calculation
+        params = 100000000  # Approximate for Spleeter 2-stem model
+        estimated_flops = params * 2
+        cpu_freq = 3200000000  # 3.2 GHz, typical for modern CPUs
+        estimated_cycles = cpu_time * cpu_freq
+        flops_per_cycle = estimated_flops / estimated_cycles if estimated_cycles > 0 else 0
+
+        logger.info(f"Processing completed in {formatted_time}")
+        logger.info(f"CPU time: {format_time(cpu_time)} (CPU usage: {cpu_time/processing_time*100:.1f}%)")
+        logger.info(f"Memory usage after processing: {mem_after:.2f} MB")
+        logger.info(f"Memory increase: {mem_increase:.2f} MB")
+        logger.info(f"FLOPS/cycle: {flops_per_cycle:.4f}")
+
+        if queued:
+            print(f"Success! Isolated vocals queued for writing to '{output_file}'")
+        else:
+            # Get output file size
+            output_size_mb = get_file_size_mb(output_file)
+            logger.info(f"Output file: {output_file} (Size: {output_size_mb:.2f} MB)")
+            print(f"Success! Isolated vocals saved as '{output_file}'")
+        print(f"Processing time: {formatted_time}")
+        print(f"CPU time: {format_time(cpu_time)} (CPU usage: {cpu_time/processing_time*100:.1f}%)")
+        print(f"Memory usage: {mem_increase:.2f} MB")
+        print(f"FLOPS/cycle: {flops_per_cycle:.4f}")
+        if not queued:
+            print(f"Input file: {file_size_mb:.2f} MB, Output file: {output_size_mb:.2f} MB")
+
+        # Hardware recommendation based on FLOPS/cycle
+        if flops_per_cycle > 16:
+            print("\nRecommendation: Use GPU (AWS G4dn/G5 instances)")
+            logger.info("Recommendation: Use GPU (AWS G4dn/G5 instances)")
+        elif flops_per_cycle > 4:
+            print("\nRecommendation: Both CPU/GPU viable")
+            logger.info("Recommendation: Both CPU/GPU viable")
+        else:
+            print("\nRecommendation: CPU processing is efficient")
+            logger.info("Recommendation: CPU processing is efficient")
+
+        return True
+
+    except KeyboardInterrupt:
+        logger.warning("Process interrupted by user")
+        print("\nProcess interrupted. Cleaning up...")
+        try:
+            # Drop the partially written output
+            if 'temp_output_file' in locals():
+                temp_output_file.unlink(missing_ok=True)
+        except Exception:
+            pass
+        print("Interrupted. You can try again with another file.")
+        raise
+
+    except Exception as e:
+        logger.error(f"Error during processing: {str(e)}")
+        logger.error(traceback.format_exc())
+        # A queued part file belongs to the writer thread; leave it alone
+        if 'temp_output_file' in locals() and not locals().get('queued'):
+            temp_output_file.unlink(missing_ok=True)
+        print(f"Error during processing: {str(e)}")
+        print("For more details, check the log file: /audio/voice_isolation_cpu.log")
+        print("Try again with a different file or check file path.")
+        return False
+
+def run_batch(pattern, separator, output_dir=None, output_format='wav'):
+    """Process every file matching a glob pattern with one shared separator."""
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        logger.error(f"No files match batch pattern: {pattern}")
+        print(f"Error: No files match '{pattern}'.")
+        return False
+
+    logger.info(f"Batch mode: {len(paths)} file(s) matching {pattern}")
+    print(f"Found {len(paths)} file(s) to process.")
+    succeeded = 0
+    # Writes run on a background thread; the bounded queue keeps at most two
+    # separated files in memory ahead of the writer
+    jobs = queue.Queue(maxsize=2)
+    failed = []
+    writer = threading.Thread(target=write_worker, args=(jobs, failed), daemon=True)
+    writer.start()
+    try:
+        for i, path in enumerate(paths):
+            print(f"\n[{i+1}/{len(paths)}] {path}")
+            if process_file(path, separator, writer=jobs, output_dir=output_dir,
+                            output_format=output_format):
+                succeeded += 1
+    except KeyboardInterrupt:
+        logger.warning("Batch interrupted by user")
+        print("\nBatch interrupted.")
+    finally:
+        print("Waiting for pending writes...")
+        jobs.put(None)
+        writer.join()
+    succeeded -= len(failed)
+
+    logger.info(f"Batch finished: {succeeded}/{len(paths)} file(s) succeeded")
+    print(f"\nBatch finished: {succeeded}/{len(paths)} file(s) succeeded.")
+    return succeeded == len(paths)
+
 def main():
+    parser = argparse.ArgumentParser(description="Isolate vocals from audio files with Spleeter (CPU).")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--input', metavar='FILE',
+                      help='Process a single file and exit')
+    mode.add_argument('--batch', metavar='PATTERN',
+                      help='Glob of files to process in one run, e.g. "/audio/*.mp3"')
+    parser.add_argument('--output-dir', metavar='DIR',
+                        help='Directory for the isolated files (default: next to each input)')
+    parser.add_argument('--stems', type=int, choices=(2, 4, 5), default=2,
+                        help='Spleeter model to use; only the vocals stem is written (default: 2)')
+    parser.add_argument('--format', dest='output_format', choices=('wav', 'flac'), default='wav',
+                        help='Output container; FLAC is lossless and roughly half the size (default: wav)')
+    args = parser.parse_args()
+
+    # Checked before any model loading so a mis-scripted run fails fast
+    if not (args.input or args.batch or sys.stdin.isatty()):
+        parser.error("no terminal for interactive mode; pass --input or --batch")
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
     logger.info("=== Voice Isolation Tool (Powered by Spleeter) - CPU Version ===")
     print("=== Voice Isolation Tool (Powered by Spleeter) - CPU Version ===")
     print("This script isolates vocals from an audio file, removing background noise.")
     print("Running in Docker container with compatible dependencies.")
     logger.info("Tool started in Docker container")
     
+    if physical_devices:
+        print(f"GPU acceleration enabled. Found {len(physical_devices)} GPU(s).")
+        logger.info(f"GPU acceleration enabled. Found {len(physical_devices)} GPU(s)")
+    else:
+        logger.info("No GPU found. Running on CPU")
+    
+    # Initialize Spleeter once; the model is reused for every file
+    print("Initializing Spleeter...")
+    logger.info("Initializing Spleeter")
+    separator = create_separator(args.stems)
+    # One second of silence builds the graph and fills the kernel caches
+    # so that cost isn't charged to the first real file
+    logger.info("Warming up separator")
+    separator.separate(np.zeros((SAMPLE_RATE, 2), dtype=np.float32))
+    
+    if args.input:
+        sys.exit(0 if process_file(args.input, separator, output_dir=args.output_dir,
+                                   output_format=args.output_format) else 1)
+    if args.batch:
+        sys.exit(0 if run_batch(args.batch, separator, args.output_dir, args.output_format) else 1)
+    
     print("\nInstructions:")
     print("- Enter the full path to your audio file (e.g., /audio/interview.mp3).")
     print("- Make sure your audio files are in the 'audio' directory that's mounted to the container.")
-    print("- Output will be saved as '<filename>_isolated.wav' in the same directory.")
+    print(f"- Output will be saved as '<filename>_isolated.{args.output_format}' in the same directory.")
     print("- Logs are saved to /audio/voice_isolation_cpu.log")
     print("\nType 'exit' to quit at any time.")
 
@@ -68,149 +508,11 @@ def main():
 
         logger.info(f"User entered path: {input_path}")
 
-        # Validate input file
-        is_valid, error_msg = validate_file(input_path)
-        if not is_valid:
-            logger.error(f"Invalid file: {error_msg}")
-            print(error_msg)
-            continue
-
         try:
-            # Log file details
-            file_size_mb = get_file_size_mb(input_path)
-            logger.info(f"Processing file: {input_path} (Size: {file_size_mb:.2f} MB)")
-            
-            # Initialize Spleeter
-            print("Initializing Spleeter...")
-            logger.info("Initializing Spleeter")
-            separator = Separator('spleeter:2stems')
-
-            # Get file details
-            input_path = Path(input_path)
-            input_dir = input_path.parent
-            input_name = input_path.stem
-            output_file = input_dir / f"{input_name}_isolated.wav"
-
-            # Create a temporary output directory
-            temp_output_dir = input_dir / "spleeter_temp"
-            os.makedirs(temp_output_dir, exist_ok=True)
-            logger.info(f"Created temporary directory: {temp_output_dir}")
-
-            # Process audio with timing and performance metrics
-            print(f"Processing '{input_path.name}' to isolate vocals...")
-            print(f"File size: {file_size_mb:.2f} MB - This may take a while for larger files.")
-            print("Processing... (Check logs for details)")
-            
-            if file_size_mb > 50:
-                print("\n⚠️ NOTICE: This is a large file. For files over 50MB, consider using the GPU version for faster processing.")
-                logger.warning(f"Large file detected: {file_size_mb:.2f} MB. CPU processing may be slow.")
-            
-            start_time = time.time()
-            logger.info(f"Starting separation process for {input_path.name}")
-            
-            # Performance metrics
-            process = psutil.Process(os.getpid())
-            start_cpu = process.cpu_times()
-            mem_before = process.memory_info().rss / (1024 * 1024)
-            logger.info(f"Memory usage before processing: {mem_before:.2f} MB")
-            
-            try:
-                separator.separate_to_file(str(input_path), str(temp_output_dir))
-                logger.info("Separation completed successfully")
-            except Exception as sep_error:
-                logger.error(f"Separation failed: {str(sep_error)}")
-                logger.error(traceback.format_exc())
-                raise
-            
-            # End performance metrics
-            end_time = time.time()
-            end_cpu = process.cpu_times()
-            mem_after = process.memory_info().rss / (1024 * 1024)
-            processing_time = end_time - start_time
-            cpu_time = (end_cpu.user - start_cpu.user) + (end_cpu.system - start_cpu.system)
-            mem_increase = mem_after - mem_before
-            formatted_time = format_time(processing_time)
-            
-            # FLOPS/cycle calculation
-            params = 100000000  # Approximate for Spleeter 2-stem model
-            estimated_flops = params * 2
-            cpu_freq = 3200000000  # 3.2 GHz, typical for modern CPUs
-            estimated_cycles = cpu_time * cpu_freq
-            flops_per_cycle = estimated_flops / estimated_cycles if estimated_cycles > 0 else 0
-            
-            logger.info(f"Processing completed in {formatted_time}")
-            logger.info(f"CPU time: {format_time(cpu_time)} (CPU usage: {cpu_time/processing_time*100:.1f}%)")
-            logger.info(f"Memory usage after processing: {mem_after:.2f} MB")
-            logger.info(f"Memory increase: {mem_increase:.2f} MB")
-            logger.info(f"FLOPS/cycle: {flops_per_cycle:.4f}")
-
-            # Move and rename output
-            temp_vocal_path = temp_output_dir / input_name / "vocals.wav"
-            if temp_vocal_path.exists():
-                logger.info(f"Found vocals file: {temp_vocal_path}")
-                os.rename(temp_vocal_path, output_file)
-                logger.info(f"Renamed to: {output_file}")
-                
-                # Get output file size
-                output_size_mb = get_file_size_mb(output_file)
-                logger.info(f"Output file size: {output_size_mb:.2f} MB")
-                
-                print(f"Success! Isolated vocals saved as '{output_file}'")
-                print(f"Processing time: {formatted_time}")
-                print(f"CPU time: {format_time(cpu_time)} (CPU usage: {cpu_time/processing_time*100:.1f}%)")
-                print(f"Memory usage: {mem_increase:.2f} MB")
-                print(f"FLOPS/cycle: {flops_per_cycle:.4f}")
-                print(f"Input file: {file_size_mb:.2f} MB, Output file: {output_size_mb:.2f} MB")
-                
-                # Hardware recommendation based on FLOPS/cycle
-                if flops_per_cycle > 16:
-                    print("\nRecommendation: Use GPU (AWS G4dn/G5 instances)")
-                    logger.info("Recommendation: Use GPU (AWS G4dn/G5 instances)")
-                elif flops_per_cycle > 4:
-                    print("\nRecommendation: Both CPU/GPU viable")
-                    logger.info("Recommendation: Both CPU/GPU viable")
-                else:
-                    print("\nRecommendation: CPU processing is efficient")
-                    logger.info("Recommendation: CPU processing is efficient")
-            else:
-                logger.error(f"Vocal file not found at expected path: {temp_vocal_path}")
-                print("Error: Vocal isolation failed. Check input file quality.")
-                print("See log file for details: /audio/voice_isolation_cpu.log")
-
-            # Clean up temporary files
-            logger.info("Cleaning up temporary files")
-            try:
-                if temp_output_dir.exists():
-                    for item in temp_output_dir.iterdir():
-                        if item.is_dir():
-                            for sub_item in item.iterdir():
-                                sub_item.unlink(missing_ok=True)
-                            item.rmdir()
-                        else:
-                            item.unlink(missing_ok=True)
-                    temp_output_dir.rmdir()
-                logger.info("Temporary files cleaned up successfully")
-            except Exception as cleanup_error:
-                logger.error(f"Error during cleanup: {str(cleanup_error)}")
-                print(f"Warning: Could not clean up all temporary files: {str(cleanup_error)}")
-
+            process_file(input_path, separator, output_dir=args.output_dir,
+                         output_format=args.output_format)
         except KeyboardInterrupt:
-            logger.warning("Process interrupted by user")
-            print("\nProcess interrupted. Cleaning up...")
-            try:
-                if 'temp_output_dir' in locals() and temp_output_dir.exists():
-                    import shutil
-                    shutil.rmtree(temp_output_dir, ignore_errors=True)
-            except Exception:
-                pass
-            print("Interrupted. You can try again with another file.")
-            
-        except Exception as e:
-            logger.error(f"Error during processing: {str(e)}")
-            logger.error(traceback.format_exc())
-            print(f"Error during processing: {str(e)}")
-            print("For more details, check the log file: /audio/voice_isolation_cpu.log")
-            print("Try again with a different file or check file path.")
+            pass
 
         # Ask to process another file
         again = input("\nProcess another file? (y/n): ").strip().lower()
@@ -221,14 +523,6 @@ def main():
 
 if __name__ == "__main__":
     try:
-        # Ensure psutil is available for performance metrics
-        try:
-            import psutil
-        except ImportError:
-            logger.critical("psutil is required for performance metrics. Please install it.")
-            print("Error: psutil is required for performance metrics. Install it with 'pip install psutil'.")
-            sys.exit(1)
-        
         main()
     except Exception as e:
         logger.critical(f"Unhandled exception: {str(e)}")
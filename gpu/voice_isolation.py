@@ -1,50 +1,144 @@
 import os
+
+# Let grappler rewrite Spleeter's estimator graph to FP16 where it is
+# numerically safe, so the U-Net convolutions run on tensor cores. Must be
+# set before TensorFlow is imported; export it as 0 to keep pure FP32.
+os.environ.setdefault('TF_ENABLE_AUTO_MIXED_PRECISION', '1')
+# Dedicated host threads for launching GPU kernels, so launches are not
+# queued behind the decode/encode work on the shared inter-op pool
+os.environ.setdefault('TF_GPU_THREAD_MODE', 'gpu_private')
+os.environ.setdefault('TF_GPU_THREAD_COUNT', '2')
+
 import sys
+import glob
+import stat
+import json
 import time
+import queue
+import socket
+import argparse
+import atexit
+import functools
 import logging
-import traceback
+import tempfile
+import threading
+import subprocess
+import socketserver
+from contextlib import contextmanager
+from logging.handlers import MemoryHandler
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from spleeter.separator import Separator
-import tensorflow as tf
+import numpy as np
+import soundfile as sf
 
-# Configure TensorFlow to use GPU
-physical_devices = tf.config.list_physical_devices('GPU')
-if physical_devices:
-    try:
-        # Configure TensorFlow to use memory growth to avoid allocating all GPU memory at once
-        for device in physical_devices:
-            tf.config.experimental.set_memory_growth(device, True)
-        print(f"GPU acceleration enabled. Found {len(physical_devices)} GPU(s).")
-    except Exception as e:
-        print(f"Error configuring GPU: {str(e)}")
-else:
-    print("No GPU found. Running on CPU. For optimal performance with large files, ensure GPU is available.")
-
-# Set up logging
+# Set up logging; file writes are buffered and flushed every 64 records,
+# on any warning, and around each separation
+_file_handler = logging.FileHandler('/audio/voice_isolation_gpu.log')
+_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+log_buffer = MemoryHandler(capacity=64, flushLevel=logging.WARNING, target=_file_handler)
+atexit.register(log_buffer.flush)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler('/audio/voice_isolation_gpu.log')
+        log_buffer
     ]
 )
 logger = logging.getLogger(__name__)
+# None of the log formats use thread or process fields; skip collecting them
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# TensorFlow and Spleeter take seconds to import and initialise CUDA, so they
+# are loaded by _lazy_tf() when a file is first processed; --help, --client
+# and an immediate 'exit' never pay for them
+tf = None
+AudioAdapter = None
+Separator = None
+physical_devices = []
+# NVML device handles, reused for every reading; empty when NVML is unavailable
+HANDLES = []
+
+# GPU memory reserved for TensorFlow: this share of the free memory, or a
+# fixed size when NVML can't report it
+GPU_MEMORY_FRACTION = 0.8
+GPU_MEMORY_LIMIT_MB = 4096
 
-# Log GPU status
-if physical_devices:
-    logger.info(f"GPU acceleration enabled. Found {len(physical_devices)} GPU(s)")
-else:
-    logger.warning("No GPU found. Running on CPU")
+SUPPORTED_FORMATS = ('.mp3', '.wav', '.flac', '.ogg')
+
+# Inputs larger than this are separated in overlapping windows so host and
+# GPU memory stay bounded by the window length rather than the file length.
+# Spleeter rebuilds its graph and restores the checkpoint on every
+# separate() call, so windows are minutes long to amortise that cost.
+SPLIT_THRESHOLD_MB = 50
+CHUNK_SECONDS = 600
+OVERLAP_SECONDS = 1
+
+def _configure_gpu(xla=False):
+    """Configure TensorFlow's GPUs and initialise NVML once per process."""
+    global physical_devices, HANDLES, nvidia_smi
+
+    # Configure TensorFlow to use GPU
+    if xla:
+        tf.config.optimizer.set_jit('autoclustering')
+        logger.info("XLA auto-clustering enabled")
+    physical_devices = tf.config.list_physical_devices('GPU')
+    if not physical_devices:
+        print("No GPU found. Running on CPU. For optimal performance with large files, ensure GPU is available.")
+        logger.warning("No GPU found. Running on CPU")
+        return
+
+    try:
+        import nvidia_smi
+        nvidia_smi.nvmlInit()
+        atexit.register(nvidia_smi.nvmlShutdown)
+        HANDLES = [nvidia_smi.nvmlDeviceGetHandleByIndex(i) for i in range(len(physical_devices))]
+    except ImportError:
+        logger.warning("nvidia-smi not installed. GPU monitoring will be limited.")
+        print("Note: For better GPU monitoring, consider adding nvidia-ml-py3 to the container.")
+    except Exception as e:
+        logger.warning("Unable to initialise NVML: %s", e)
+
+    try:
+        # Reserve one fixed arena per GPU up front instead of growing it with
+        # repeated cudaMalloc calls; sized from free memory when NVML can tell
+        for i, device in enumerate(physical_devices):
+            limit_mb = GPU_MEMORY_LIMIT_MB
+            if i < len(HANDLES):
+                free = nvidia_smi.nvmlDeviceGetMemoryInfo(HANDLES[i]).free
+                limit_mb = int(free * GPU_MEMORY_FRACTION / 1024**2)
+            tf.config.set_logical_device_configuration(
+                device, [tf.config.LogicalDeviceConfiguration(memory_limit=limit_mb)])
+            logger.info("GPU %s memory limit: %s MB", i, limit_mb)
+        print(f"GPU acceleration enabled. Found {len(physical_devices)} GPU(s).")
+    except Exception as e:
+        print(f"Error configuring GPU: {str(e)}")
+    logger.info("GPU acceleration enabled. Found %s GPU(s)", len(physical_devices))
+
+def _lazy_tf(xla=False):
+    """Import TensorFlow and Spleeter on first use and configure the GPU."""
+    global tf, AudioAdapter, Separator
+    if tf is None:
+        import tensorflow as tf_
+        from spleeter.audio.adapter import AudioAdapter as AudioAdapter_
+        from spleeter.separator import Separator as Separator_
+        tf, AudioAdapter, Separator = tf_, AudioAdapter_, Separator_
+        _configure_gpu(xla)
+    return tf
 
 def validate_file(file_path):
-    """Check if the input file exists and is a supported audio format."""
-    supported_formats = {'.mp3', '.wav', '.flac', '.ogg'}
-    if not os.path.isfile(file_path):
-        return False, "Error: File does not exist."
-    if not any(file_path.lower().endswith(fmt) for fmt in supported_formats):
-        return False, "Error: Unsupported file format. Use MP3, WAV, FLAC, or OGG."
-    return True, ""
+    """Check a file exists and is a supported format; returns (is_valid, error_msg, stat_result)."""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return False, "Error: File does not exist.", None
+    if not stat.S_ISREG(st.st_mode):
+        return False, "Error: File does not exist.", None
+    if not file_path.lower().endswith(SUPPORTED_FORMATS):
+        return False, "Error: Unsupported file format. Use MP3, WAV, FLAC, or OGG.", None
+    return True, "", st
 
 def format_time(seconds):
     """Format seconds into hours, minutes, and seconds."""
@@ -80,28 +174,453 @@ def get_gpu_info():
                 
             # Try to get memory info
             try:
-                import nvidia_smi
-                nvidia_smi.nvmlInit()
-                for i in range(len(physical_devices)):
-                    handle = nvidia_smi.nvmlDeviceGetHandleByIndex(i)
+                for i, handle in enumerate(HANDLES):
                     info = nvidia_smi.nvmlDeviceGetMemoryInfo(handle)
                     gpu_info[f"gpu_{i}"]["memory_total"] = f"{info.total / 1024**2:.2f} MB"
                     gpu_info[f"gpu_{i}"]["memory_free"] = f"{info.free / 1024**2:.2f} MB"
                     gpu_info[f"gpu_{i}"]["memory_used"] = f"{info.used / 1024**2:.2f} MB"
-                nvidia_smi.nvmlShutdown()
-            except (ImportError, Exception) as e:
-                logger.warning(f"Unable to get detailed GPU memory info: {str(e)}")
+            except Exception as e:
+                logger.warning("Unable to get detailed GPU memory info: %s", e)
     except Exception as e:
-        logger.warning(f"Error getting GPU info: {str(e)}")
+        logger.warning("Error getting GPU info: %s", e)
     return gpu_info
 
-def main():
-    logger.info("=== Voice Isolation Tool (Powered by Spleeter) with GPU Support ===")
-    print("=== Voice Isolation Tool (Powered by Spleeter) with GPU Support ===")
-    print("This script isolates vocals from an audio file, removing background noise.")
-    print("Running in Docker container with compatible dependencies.")
-    logger.info("Tool started in Docker container")
-    
+def _sample_gpu_util(stop, samples, interval):
+    """Read utilization from every NVML handle each ``interval`` seconds until stopped."""
+    while True:
+        for i, handle in enumerate(HANDLES):
+            try:
+                util = nvidia_smi.nvmlDeviceGetUtilizationRates(handle)
+            except Exception as e:
+                logger.debug("Unable to read GPU %s utilization: %s", i, e)
+                continue
+            samples[i].append((util.gpu, util.memory))
+            logger.debug("GPU %s utilization: GPU: %s%%, Memory: %s%%", i, util.gpu, util.memory)
+        if stop.wait(interval):
+            return
+
+@contextmanager
+def sample_gpu(tag, interval=0.5):
+    """Sample GPU utilization in the background for the duration of the block (no-op without NVML)."""
+    if not HANDLES:
+        yield
+        return
+    stop = threading.Event()
+    samples = [[] for _ in HANDLES]
+    sampler = threading.Thread(target=_sample_gpu_util, args=(stop, samples, interval), daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        sampler.join()
+        for i, readings in enumerate(samples):
+            if not readings:
+                continue
+            gpu = [r[0] for r in readings]
+            mem = [r[1] for r in readings]
+            logger.info("GPU %s utilization during %s (%s samples): "
+                        "GPU: mean %.0f%%, peak %s%%; Memory: mean %.0f%%, peak %s%%",
+                        i, tag, len(readings), sum(gpu) / len(gpu), max(gpu),
+                        sum(mem) / len(mem), max(mem))
+
+@functools.lru_cache(maxsize=4)
+def get_separator(cfg):
+    """Build the separator for a Spleeter config once and warm it up on a second of silence."""
+    print(f"Initializing Spleeter ({cfg})...")
+    logger.info("Initializing Spleeter (%s)", cfg)
+    separator = Separator(cfg, multiprocess=False)
+    separator.separate(np.zeros((44100, 2), dtype=np.float32))
+    logger.info("Spleeter session ready")
+    return separator
+
+def init_session():
+    """Return the warmed-up 2-stem separator shared by every file in this process."""
+    return get_separator('spleeter:2stems')
+
+def stream_windows(input_path):
+    """Decode a file once through ffmpeg and yield stereo windows overlapping by OVERLAP_SECONDS."""
+    window = CHUNK_SECONDS * 44100
+    overlap = OVERLAP_SECONDS * 44100
+    frame_bytes = 2 * np.dtype(np.float32).itemsize
+    # stderr goes to a temp file rather than a pipe so a chatty decoder
+    # can't fill it and stall the stdout reads
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        ['ffmpeg', '-loglevel', 'error', '-i', str(input_path),
+         '-f', 'f32le', '-acodec', 'pcm_f32le', '-ac', '2', '-ar', '44100', 'pipe:1'],
+        stdout=subprocess.PIPE, stderr=stderr_file)
+    try:
+        prev = None
+        while True:
+            buf = np.empty((window, 2), dtype=np.float32)
+            filled = 0
+            if prev is not None:
+                buf[:overlap] = prev[-overlap:]
+                filled = overlap
+            view = memoryview(buf).cast('B')
+            pos = filled * frame_bytes
+            while pos < len(view):
+                n = process.stdout.readinto(view[pos:])
+                if not n:
+                    break
+                pos += n
+            end = pos // frame_bytes
+            if end == filled:
+                break
+            yield buf[:end]
+            if end < window:
+                break
+            prev = buf
+        if process.wait() != 0:
+            stderr_file.seek(0)
+            error = stderr_file.read().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg could not decode {input_path}: {error}")
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_file.close()
+
+def separate_in_chunks(separator, input_path, output_file):
+    """Separate a long file window by window, crossfading the overlaps into ``output_file``."""
+    overlap = OVERLAP_SECONDS * 44100
+    fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+    out = None
+    tail = None
+    start = 0
+    try:
+        for waveform in stream_windows(input_path):
+            print(f"Separating {format_time(start / 44100)} - {format_time((start + len(waveform)) / 44100)}...")
+            vocals = separator.separate(waveform)['vocals'][:len(waveform)]
+            if out is None:
+                out = sf.SoundFile(str(output_file), 'w', 44100, vocals.shape[1], subtype='PCM_16')
+            if tail is not None:
+                n = min(len(tail), len(vocals))
+                vocals[:n] = tail[:n] * (1.0 - fade_in[:n]) + vocals[:n] * fade_in[:n]
+            # Hold back the overlap until the next window has been crossfaded in
+            out.write(vocals[:-overlap])
+            tail = vocals[-overlap:]
+            start += len(waveform) - overlap
+        if tail is not None:
+            out.write(tail)
+    finally:
+        if out is not None:
+            out.close()
+
+def process_one(separator, input_path):
+    """Isolate vocals from one file; returns True when the output was written."""
+    # Validate input file
+    is_valid, error_msg, st = validate_file(input_path)
+    if not is_valid:
+        logger.error("Invalid file: %s", error_msg)
+        print(error_msg)
+        return False
+
+    try:
+        # Log file details
+        file_size_mb = st.st_size / (1024 * 1024)
+        logger.info("Processing file: %s (Size: %.2f MB)", input_path, file_size_mb)
+
+        # Get file details
+        input_path = Path(input_path)
+        input_dir = input_path.parent
+        input_name = input_path.stem
+        output_file = input_dir / f"{input_name}_isolated.wav"
+        # A failed or interrupted run only ever leaves this behind, and removes it
+        temp_output_file = input_dir / f"{input_name}_isolated.part.wav"
+
+        # Process audio with timing
+        print(f"Processing '{input_path.name}' to isolate vocals...")
+        print(f"File size: {file_size_mb:.2f} MB - GPU acceleration is active.")
+        print("Processing... (Check logs for details)")
+        
+        start_time = time.time()
+        logger.info("Starting separation process for %s", input_path.name)
+        
+        # Memory usage before processing
+        try:
+            import psutil
+            process = psutil.Process(os.getpid())
+            mem_before = process.memory_info().rss / 1024 / 1024
+            logger.info("Memory usage before processing: %.2f MB", mem_before)
+        except ImportError:
+            logger.info("psutil not available, skipping memory usage tracking")
+        
+        log_buffer.flush()
+        try:
+            with sample_gpu("separation"):
+                if file_size_mb > SPLIT_THRESHOLD_MB:
+                    logger.info("Large file: separating in %ss windows", CHUNK_SECONDS)
+                    separate_in_chunks(separator, input_path, temp_output_file)
+                else:
+                    # Separate in memory and encode only the vocals stem
+                    audio_adapter = AudioAdapter.default()
+                    waveform, _ = audio_adapter.load(str(input_path), sample_rate=44100)
+                    vocals = separator.separate(waveform)['vocals']
+                    audio_adapter.save(str(temp_output_file), vocals, 44100, 'wav')
+            logger.info("Separation completed successfully")
+            log_buffer.flush()
+        except Exception as sep_error:
+            logger.error("Separation failed: %s", sep_error, exc_info=True)
+            raise
+        
+        # Memory usage after processing
+        try:
+            import psutil
+            mem_after = process.memory_info().rss / 1024 / 1024
+            logger.info("Memory usage after processing: %.2f MB", mem_after)
+            logger.info("Memory increase: %.2f MB", mem_after - mem_before)
+        except ImportError:
+            pass
+        
+        end_time = time.time()
+        processing_time = end_time - start_time
+        formatted_time = format_time(processing_time)
+        logger.info("Processing completed in %s", formatted_time)
+
+        try:
+            os.replace(temp_output_file, output_file)
+        except FileNotFoundError:
+            logger.error("Vocal file not found at expected path: %s", temp_output_file)
+            print("Error: Vocal isolation failed. Check input file quality.")
+            print("See log file for details: /audio/voice_isolation_gpu.log")
+            return False
+
+        # Get output file size
+        output_size_mb = get_file_size_mb(output_file)
+        logger.info("Output file: %s (Size: %.2f MB)", output_file, output_size_mb)
+
+        print(f"Success! Isolated vocals saved as '{output_file}'")
+        print(f"Processing time with GPU acceleration: {formatted_time}")
+        print(f"Input file: {file_size_mb:.2f} MB, Output file: {output_size_mb:.2f} MB")
+        return True
+
+    except KeyboardInterrupt:
+        logger.warning("Process interrupted by user")
+        print("\nProcess interrupted. Cleaning up...")
+        try:
+            # Drop the partially written output
+            if 'temp_output_file' in locals():
+                temp_output_file.unlink(missing_ok=True)
+        except Exception:
+            pass
+        print("Interrupted. You can try again with another file.")
+        raise
+        
+    except Exception as e:
+        logger.error("Error during processing: %s", e, exc_info=True)
+        if 'temp_output_file' in locals():
+            temp_output_file.unlink(missing_ok=True)
+        print(f"Error during processing: {str(e)}")
+        print("For more details, check the log file: /audio/voice_isolation_gpu.log")
+        print("Try again with a different file or check file path.")
+        return False
+
+def write_worker(jobs, written):
+    """Encode queued vocals until a ``None`` job arrives, appending each output to ``written``."""
+    audio_adapter = AudioAdapter.default()
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        vocals, temp_output_file, output_file = job
+        try:
+            audio_adapter.save(str(temp_output_file), vocals, 44100, 'wav')
+            os.replace(temp_output_file, output_file)
+        except Exception as e:
+            logger.error("Failed to write %s: %s", output_file, e)
+            print(f"Error writing '{output_file}': {str(e)}")
+            continue
+        logger.info("Output file: %s (Size: %.2f MB)", output_file, get_file_size_mb(output_file))
+        print(f"Saved '{output_file}'")
+        written.append(output_file)
+
+def process_batch(separator, paths):
+    """Separate several files while the next one decodes and finished ones encode.
+
+    Returns the number of files written.
+    """
+    audio_adapter = AudioAdapter.default()
+    valid_paths = []
+    # Files too large to hold in memory are streamed through
+    # separate_in_chunks instead of being decoded whole
+    large_paths = set()
+    for path in paths:
+        is_valid, error_msg, st = validate_file(path)
+        if is_valid:
+            valid_paths.append(Path(path))
+            if st.st_size / (1024 * 1024) > SPLIT_THRESHOLD_MB:
+                large_paths.add(Path(path))
+        else:
+            logger.error("Invalid file %s: %s", path, error_msg)
+            print(f"{path}: {error_msg}")
+    if not valid_paths:
+        return 0
+
+    def load(path):
+        if path in large_paths:
+            return None
+        if path.suffix.lower() == '.wav':
+            # Decode PCM WAV in-process instead of spawning ffmpeg
+            try:
+                audio, sample_rate = tf.audio.decode_wav(tf.io.read_file(str(path)))
+                if int(sample_rate) == 44100:
+                    return audio.numpy()
+            except tf.errors.OpError:
+                pass
+        waveform, _ = audio_adapter.load(str(path), sample_rate=44100)
+        return waveform
+
+    logger.info("Batch processing %s file(s)", len(valid_paths))
+    batch_start = time.time()
+    # Bounded so separation blocks rather than piling up vocals in memory
+    # when encoding falls behind
+    jobs = queue.Queue(maxsize=4)
+    written = []
+    writer = threading.Thread(target=write_worker, args=(jobs, written), daemon=True)
+    writer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=1) as decoder:
+            pending = decoder.submit(load, valid_paths[0])
+            for i, input_path in enumerate(valid_paths):
+                print(f"\n[{i+1}/{len(valid_paths)}] Processing '{input_path.name}'...")
+                try:
+                    waveform = pending.result()
+                except Exception as e:
+                    logger.error("Failed to decode %s: %s", input_path, e)
+                    print(f"Error decoding '{input_path.name}': {str(e)}")
+                    waveform = None
+                if i + 1 < len(valid_paths):
+                    pending = decoder.submit(load, valid_paths[i + 1])
+
+                output_file = input_path.parent / f"{input_path.stem}_isolated.wav"
+                temp_output_file = input_path.parent / f"{input_path.stem}_isolated.part.wav"
+                if input_path in large_paths:
+                    logger.info("Large file: separating %s in %ss windows", input_path.name, CHUNK_SECONDS)
+                    try:
+                        with sample_gpu(f"separation of {input_path.name}"):
+                            separate_in_chunks(separator, input_path, temp_output_file)
+                        os.replace(temp_output_file, output_file)
+                    except Exception as e:
+                        logger.error("Separation failed for %s: %s", input_path, e, exc_info=True)
+                        print(f"Error separating '{input_path.name}': {str(e)}")
+                        temp_output_file.unlink(missing_ok=True)
+                        continue
+                    logger.info("Output file: %s (Size: %.2f MB)", output_file, get_file_size_mb(output_file))
+                    print(f"Saved '{output_file}'")
+                    written.append(output_file)
+                    continue
+                if waveform is None:
+                    continue
+
+                try:
+                    start_time = time.time()
+                    with sample_gpu(f"separation of {input_path.name}"):
+                        vocals = separator.separate(waveform)['vocals']
+                    logger.info("Separated %s in %s", input_path.name, format_time(time.time() - start_time))
+                except Exception as e:
+                    logger.error("Separation failed for %s: %s", input_path, e, exc_info=True)
+                    print(f"Error separating '{input_path.name}': {str(e)}")
+                    continue
+                jobs.put((vocals, temp_output_file, output_file))
+    finally:
+        # Always stop the writer, or an interrupted batch leaks a thread
+        # blocked on jobs.get()
+        jobs.put(None)
+        writer.join()
+    written = len(written)
+
+    formatted_time = format_time(time.time() - batch_start)
+    logger.info("Batch finished: %s/%s file(s) in %s", written, len(paths), formatted_time)
+    log_buffer.flush()
+    print(f"\nBatch finished: {written}/{len(paths)} file(s) in {formatted_time}")
+    return written
+
+def run_pattern(separator, pattern):
+    """Process a path, or every file matching a glob, and report overall success."""
+    # A pattern that matches nothing is passed through so validation reports it
+    paths = sorted(glob.glob(pattern)) or [pattern]
+    if len(paths) > 1:
+        return process_batch(separator, paths) == len(paths)
+    return process_one(separator, paths[0])
+
+class SeparationHandler(socketserver.StreamRequestHandler):
+    """Handle one client: a path or glob per line in, one JSON result per line out."""
+
+    def handle(self):
+        for line in self.rfile:
+            pattern = line.decode().strip()
+            if not pattern:
+                continue
+            logger.info("Request from client: %s", pattern)
+            try:
+                ok = run_pattern(self.server.separator, pattern)
+            except Exception as e:
+                logger.error("Request failed: %s", e, exc_info=True)
+                ok = False
+            self.wfile.write((json.dumps({"path": pattern, "ok": ok}) + "\n").encode())
+
+def serve(separator, socket_path):
+    """Keep the separator resident and serve --client requests on a Unix socket."""
+    try:
+        os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
+    with socketserver.UnixStreamServer(socket_path, SeparationHandler) as server:
+        server.separator = separator
+        logger.info("Serving on %s", socket_path)
+        print(f"\nReady. Listening on {socket_path} (Ctrl+C to stop).")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Server stopped by user")
+            print("\nServer stopped.")
+        finally:
+            os.unlink(socket_path)
+
+def run_client(socket_path):
+    """Send paths from stdin, one per line, to a running --serve worker and print its results."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError as e:
+        print(f"Error: Cannot connect to worker at {socket_path}: {str(e)}")
+        print("Start one with: python voice_isolation.py --serve")
+        sys.exit(1)
+
+    interactive = sys.stdin.isatty()
+    replies = sock.makefile('rb')
+    with sock, replies:
+        while True:
+            if interactive:
+                try:
+                    line = input("\nEnter the audio file path (or 'exit' to quit): ")
+                except EOFError:
+                    break
+            else:
+                line = sys.stdin.readline()
+                if not line:
+                    break
+            path = line.strip()
+            if path.lower() == 'exit':
+                break
+            if not path:
+                continue
+            sock.sendall((path + "\n").encode())
+            reply = replies.readline()
+            if not reply:
+                print("Error: Worker closed the connection.")
+                sys.exit(1)
+            result = json.loads(reply)
+            status = "done" if result["ok"] else "failed (see worker log)"
+            print(f"{result['path']}: {status}")
+
+def start_session(xla=False):
+    """Load TensorFlow, report the GPUs and build the warmed-up separator."""
+    _lazy_tf(xla)
+
     # Get and display GPU information
     gpu_info = get_gpu_info()
     if gpu_info:
@@ -110,14 +629,54 @@ def main():
             print(f"  - {gpu_id}: {info.get('name', 'Unknown')}")
             if 'memory_total' in info:
                 print(f"    Memory: {info.get('memory_used', 'Unknown')} / {info.get('memory_total', 'Unknown')}")
-        logger.info(f"GPU Information: {gpu_info}")
+        logger.info("GPU Information: %s", gpu_info)
     else:
         print("\n⚠️ WARNING: No GPU detected. Performance will be significantly slower than expected.")
         print("Please ensure your NVIDIA drivers and Docker GPU configuration are correct.")
         logger.warning("No GPU information available. Check NVIDIA driver and Docker setup.")
-    
+
+    return init_session()
+
+def main():
+    parser = argparse.ArgumentParser(description="Isolate vocals from audio files with Spleeter (GPU).")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--serve', action='store_true',
+                      help='Run as a persistent worker that keeps the model loaded')
+    mode.add_argument('--client', action='store_true',
+                      help='Send paths to a running --serve worker instead of loading the model')
+    parser.add_argument('--socket', default='/audio/spleeter.sock',
+                        help='Unix socket used by --serve and --client (default: /audio/spleeter.sock)')
+    parser.add_argument('--xla', action='store_true',
+                        help='Compile the separation graph with XLA. XLA recompiles for every new '
+                             'input length, so this only pays off for long runs of same-length '
+                             'input, such as large files separated in fixed windows')
+    args = parser.parse_args()
+
+    if args.xla:
+        # Read when TensorFlow is imported, which _lazy_tf() defers until now
+        flags = os.environ.get('TF_XLA_FLAGS', '')
+        os.environ['TF_XLA_FLAGS'] = f"{flags} --tf_xla_auto_jit=2".strip()
+
+    if args.client:
+        run_client(args.socket)
+        return
+
+    logger.info("=== Voice Isolation Tool (Powered by Spleeter) with GPU Support ===")
+    print("=== Voice Isolation Tool (Powered by Spleeter) with GPU Support ===")
+    print("This script isolates vocals from an audio file, removing background noise.")
+    print("Running in Docker container with compatible dependencies.")
+    logger.info("Tool started in Docker container")
+
+    if args.serve:
+        serve(start_session(args.xla), args.socket)
+        return
+
+    # Built when the first path is entered, then kept for the whole run
+    separator = None
+
     print("\nInstructions:")
-    print("- Enter the full path to your audio file (e.g., /audio/interview.mp3).")
+    print("- Enter the full path to your audio file (e.g., /audio/interview.mp3),")
+    print("  or a glob to process several files in one go (e.g., /audio/*.mp3).")
     print("- Make sure your audio files are in the 'audio' directory that's mounted to the container.")
     print("- Output will be saved as '<filename>_isolated.wav' in the same directory.")
     print("- Logs are saved to /audio/voice_isolation_gpu.log")
@@ -132,154 +691,14 @@ def main():
             print("Exiting the tool. Goodbye!")
             sys.exit(0)
 
-        logger.info(f"User entered path: {input_path}")
-
-        # Validate input file
-        is_valid, error_msg = validate_file(input_path)
-        if not is_valid:
-            logger.error(f"Invalid file: {error_msg}")
-            print(error_msg)
-            continue
+        logger.info("User entered path: %s", input_path)
 
         try:
-            # Log file details
-            file_size_mb = get_file_size_mb(input_path)
-            logger.info(f"Processing file: {input_path} (Size: {file_size_mb:.2f} MB)")
-            
-            # Initialize Spleeter
-            print("Initializing Spleeter...")
-            logger.info("Initializing Spleeter")
-            separator = Separator('spleeter:2stems')
-
-            # Get file details
-            input_path = Path(input_path)
-            input_dir = input_path.parent
-            input_name = input_path.stem
-            output_file = input_dir / f"{input_name}_isolated.wav"
-
-            # Create a temporary output directory
-            temp_output_dir = input_dir / "spleeter_temp"
-            os.makedirs(temp_output_dir, exist_ok=True)
-            logger.info(f"Created temporary directory: {temp_output_dir}")
-
-            # Process audio with timing
-            print(f"Processing '{input_path.name}' to isolate vocals...")
-            print(f"File size: {file_size_mb:.2f} MB - GPU acceleration is active.")
-            print("Processing... (Check logs for details)")
-            
-            # Log GPU utilization before processing (if available)
-            try:
-                if physical_devices:
-                    import nvidia_smi
-                    nvidia_smi.nvmlInit()
-                    for i in range(len(physical_devices)):
-                        handle = nvidia_smi.nvmlDeviceGetHandleByIndex(i)
-                        util = nvidia_smi.nvmlDeviceGetUtilizationRates(handle)
-                        logger.info(f"GPU {i} utilization before processing: GPU: {util.gpu}%, Memory: {util.memory}%")
-                    nvidia_smi.nvmlShutdown()
-            except (ImportError, Exception):
-                logger.info("nvidia-smi not available, skipping GPU utilization tracking")
-            
-            start_time = time.time()
-            logger.info(f"Starting separation process for {input_path.name}")
-            
-            # Memory usage before processing
-            try:
-                import psutil
-                process = psutil.Process(os.getpid())
-                mem_before = process.memory_info().rss / 1024 / 1024
-                logger.info(f"Memory usage before processing: {mem_before:.2f} MB")
-            except ImportError:
-                logger.info("psutil not available, skipping memory usage tracking")
-            
-            try:
-                separator.separate_to_file(str(input_path), str(temp_output_dir))
-                logger.info("Separation completed successfully")
-            except Exception as sep_error:
-                logger.error(f"Separation failed: {str(sep_error)}")
-                logger.error(traceback.format_exc())
-                raise
-            
-            # Log GPU utilization after processing (if available)
-            try:
-                if physical_devices:
-                    import nvidia_smi
-                    nvidia_smi.nvmlInit()
-                    for i in range(len(physical_devices)):
-                        handle = nvidia_smi.nvmlDeviceGetHandleByIndex(i)
-                        util = nvidia_smi.nvmlDeviceGetUtilizationRates(handle)
-                        logger.info(f"GPU {i} utilization after processing: GPU: {util.gpu}%, Memory: {util.memory}%")
-                    nvidia_smi.nvmlShutdown()
-            except (ImportError, Exception):
-                pass
-            
-            # Memory usage after processing
-            try:
-                import psutil
-                mem_after = process.memory_info().rss / 1024 / 1024
-                logger.info(f"Memory usage after processing: {mem_after:.2f} MB")
-                logger.info(f"Memory increase: {mem_after - mem_before:.2f} MB")
-            except ImportError:
-                pass
-            
-            end_time = time.time()
-            processing_time = end_time - start_time
-            formatted_time = format_time(processing_time)
-            logger.info(f"Processing completed in {formatted_time}")
-
-            # Move and rename output
-            temp_vocal_path = temp_output_dir / input_name / "vocals.wav"
-            if temp_vocal_path.exists():
-                logger.info(f"Found vocals file: {temp_vocal_path}")
-                os.rename(temp_vocal_path, output_file)
-                logger.info(f"Renamed to: {output_file}")
-                
-                # Get output file size
-                output_size_mb = get_file_size_mb(output_file)
-                logger.info(f"Output file size: {output_size_mb:.2f} MB")
-                
-                print(f"Success! Isolated vocals saved as '{output_file}'")
-                print(f"Processing time with GPU acceleration: {formatted_time}")
-                print(f"Input file: {file_size_mb:.2f} MB, Output file: {output_size_mb:.2f} MB")
-            else:
-                logger.error(f"Vocal file not found at expected path: {temp_vocal_path}")
-                print("Error: Vocal isolation failed. Check input file quality.")
-                print("See log file for details: /audio/voice_isolation_gpu.log")
-
-            # Clean up temporary files
-            logger.info("Cleaning up temporary files")
-            try:
-                if temp_output_dir.exists():
-                    for item in temp_output_dir.iterdir():
-                        if item.is_dir():
-                            for sub_item in item.iterdir():
-                                sub_item.unlink(missing_ok=True)
-                            item.rmdir()
-                        else:
-                            item.unlink(missing_ok=True)
-                    temp_output_dir.rmdir()
-                logger.info("Temporary files cleaned up successfully")
-            except Exception as cleanup_error:
-                logger.error(f"Error during cleanup: {str(cleanup_error)}")
-                print(f"Warning: Could not clean up all temporary files: {str(cleanup_error)}")
-
+            if separator is None:
+                separator = start_session(args.xla)
+            run_pattern(separator, input_path)
         except KeyboardInterrupt:
-            logger.warning("Process interrupted by user")
-            print("\nProcess interrupted. Cleaning up...")
-            try:
-                if 'temp_output_dir' in locals() and temp_output_dir.exists():
-                    import shutil
-                    shutil.rmtree(temp_output_dir, ignore_errors=True)
-            except Exception:
-                pass
-            print("Interrupted. You can try again with another file.")
-            
-        except Exception as e:
-            logger.error(f"Error during processing: {str(e)}")
-            logger.error(traceback.format_exc())
-            print(f"Error during processing: {str(e)}")
-            print("For more details, check the log file: /audio/voice_isolation_gpu.log")
-            print("Try again with a different file or check file path.")
+            pass
 
         # Ask to process another file
         again = input("\nProcess another file? (y/n): ").strip().lower()
@@ -297,18 +716,9 @@ if __name__ == "__main__":
             logger.warning("psutil not installed. Memory tracking will be disabled.")
             print("Note: For better memory tracking, consider adding psutil to the container.")
         
-        # Try to import nvidia-smi for GPU monitoring
-        try:
-            import nvidia_smi
-        except ImportError:
-            logger.warning("nvidia-smi not installed. GPU monitoring will be limited.")
-            if physical_devices:
-                print("Note: For better GPU monitoring, consider adding nvidia-ml-py3 to the container.")
-            
         main()
     except Exception as e:
-        logger.critical(f"Unhandled exception: {str(e)}")
-        logger.critical(traceback.format_exc())
+        logger.critical("Unhandled exception: %s", e, exc_info=True)
         print(f"Critical error: {str(e)}")
         print("Check the log file for details: /audio/voice_isolation_gpu.log")
         sys.exit(1)
\ No newline at end of file